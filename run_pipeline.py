@@ -2,8 +2,9 @@
 Simple Q&A interface for Healthcare Benefits Navigator
 """
 
-from src.models.retriever import BenefitRetriever
-from typing import List, Dict
+import sys
+from src.models.retriever import BenefitRetriever, SearchResult
+from typing import List
 
 
 class HealthcareChatbot:
@@ -14,13 +15,15 @@ class HealthcareChatbot:
         self.retriever = BenefitRetriever()
         print()
     
-    def ask(self, question: str, show_details: bool = True) -> str:
+    def ask(self, question: str, show_details: bool = True,
+            results: List[SearchResult] = None) -> str:
         """
         Ask a question and get an answer
         
         Args:
             question: User's question
             show_details: Whether to show detailed results
+            results: Optional - precomputed results (e.g. from search_batch)
         
         Returns:
             Answer text
@@ -28,23 +31,26 @@ class HealthcareChatbot:
         print(f"\n❓ Question: {question}\n")
         
         # Search for relevant chunks
-        results = self.retriever.search(question, top_k=3)
+        if results is None:
+            results = self.retriever.search(question, top_k=3)
         
         if not results:
             return "❌ I couldn't find any information about that."
         
-        # Display results
-        print("📋 Found these relevant benefits:\n")
+        # Display results (collected first, written in one go)
+        out = ["📋 Found these relevant benefits:\n"]
         
         for i, result in enumerate(results, 1):
-            print(f"{i}. {result['plan_name']}")
-            print(f"   {result['text']}")
+            out.append(f"{i}. {result.plan_name}")
+            out.append(f"   {result.text}")
             
             if show_details:
-                print(f"   📊 Similarity: {result['similarity_score']:.1%}")
-                print(f"   🏷️  Category: {result['category']}")
+                out.append(f"   📊 Similarity: {result.similarity_score:.1%}")
+                out.append(f"   🏷️  Category: {result.category}")
             
-            print()
+            out.append("")
+        
+        sys.stdout.write("\n".join(out) + "\n")
         
         return results
     
@@ -55,8 +61,12 @@ class HealthcareChatbot:
         plans = self.retriever.list_plans()
         comparison = {}
         
-        for plan in plans:
-            results = self.retriever.search(benefit_query, top_k=1, plan_filter=plan)
+        # One embedding pass for all plans, filtered per plan afterwards
+        plan_results = self.retriever.search_batch(
+            [benefit_query] * len(plans), top_k=1, plan_filter=plans
+        )
+        
+        for plan, results in zip(plans, plan_results):
             if results:
                 comparison[plan] = results[0]
         
@@ -67,37 +77,42 @@ class HealthcareChatbot:
         print("📊 Comparison:\n")
         for plan, result in comparison.items():
             print(f"• {plan}:")
-            print(f"  {result['description']}")
+            print(f"  {result.description or result.text}")
             print()
     
     def list_available_plans(self):
         """Show all available plans"""
         plans = self.retriever.list_plans()
         
-        print("\n📋 Available Plans:\n")
+        out = ["\n📋 Available Plans:\n"]
         for i, plan in enumerate(plans, 1):
-            print(f"{i}. {plan}")
+            out.append(f"{i}. {plan}")
             
             # Get overview
             overview = self.retriever.get_plan_overview(plan)
             if overview:
-                print(f"   {overview['text']}")
-            print()
+                out.append(f"   {overview['text']}")
+            out.append("")
+        
+        sys.stdout.write("\n".join(out) + "\n")
     
     def show_statistics(self):
         """Display index statistics"""
         stats = self.retriever.get_statistics()
         
-        print("\n📊 System Statistics:\n")
-        print(f"Total Plans: {stats['total_plans']}")
-        print(f"Total Benefits Indexed: {stats['total_chunks']}")
-        print(f"Benefit Categories: {len(stats['categories'])}")
-        print()
-        
-        print("Plans:")
+        out = [
+            "\n📊 System Statistics:\n",
+            f"Total Plans: {stats['total_plans']}",
+            f"Total Benefits Indexed: {stats['total_chunks']}",
+            f"Benefit Categories: {len(stats['categories'])}",
+            "",
+            "Plans:",
+        ]
         for plan, count in stats['chunks_by_plan'].items():
-            print(f"  • {plan}: {count} benefits")
-        print()
+            out.append(f"  • {plan}: {count} benefits")
+        out.append("")
+        
+        sys.stdout.write("\n".join(out) + "\n")
     
     def interactive_mode(self):
         """Run interactive Q&A session"""
@@ -164,8 +179,11 @@ def demo_queries():
     
     print("🎯 Running demo queries...\n")
     
-    for question in demo_questions:
-        chatbot.ask(question, show_details=True)
+    # Embed all demo questions in one batch before printing
+    all_results = chatbot.retriever.search_batch(demo_questions, top_k=3)
+    
+    for question, results in zip(demo_questions, all_results):
+        chatbot.ask(question, show_details=True, results=results)
         print("-" * 60)
     
     # Show plan comparison
@@ -178,8 +196,6 @@ def demo_queries():
 
 
 if __name__ == "__main__":
-    import sys
-    
     if len(sys.argv) > 1 and sys.argv[1] == "demo":
         # Run demo
         demo_queries()
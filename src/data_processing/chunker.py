@@ -2,9 +2,14 @@
 Create semantic chunks from extracted data
 """
 
-import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List
+
+import ahocorasick
+import orjson
 
 
 class BenefitChunker:
@@ -31,24 +36,33 @@ class BenefitChunker:
             'meals': ['meal', 'food', 'nutrition'],
             'otc': ['over-the-counter', 'otc'],
         }
-    
-    def chunk_file(self, json_path: str) -> List[Dict]:
-        """Create chunks from one extracted JSON file"""
-        with open(json_path, 'r') as f:
-            data = json.load(f)
         
-        chunks = []
+        # One automaton for all keywords: _classify scans each text once
+        # instead of running a substring search per keyword
+        keyword_categories = {}
+        for category, keywords in self.categories.items():
+            for kw in keywords:
+                keyword_categories.setdefault(kw, []).append(category)
         
+        self._keyword_matcher = ahocorasick.Automaton()
+        for kw, categories in keyword_categories.items():
+            self._keyword_matcher.add_word(kw, (kw, tuple(categories)))
+        self._keyword_matcher.make_automaton()
+        
+        self._category_rank = {cat: i for i, cat in enumerate(self.categories)}
+    
+    def chunk_line(self, line: bytes) -> List[Dict]:
+        """Create chunks from one line of extracted.jsonl"""
+        return list(self.iter_record_chunks(orjson.loads(line)))
+    
+    def iter_record_chunks(self, data: Dict) -> Iterator[Dict]:
+        """Yield chunks from one plan's extracted data, one at a time"""
         # Create overview chunk
-        overview = self._create_overview(data['metadata'])
-        chunks.append(overview)
+        yield self._create_overview(data['metadata'])
         
         # Create benefit chunks
         for benefit in data.get('benefits', []):
-            chunk = self._create_benefit_chunk(benefit, data['metadata'])
-            chunks.append(chunk)
-        
-        return chunks
+            yield self._create_benefit_chunk(benefit, data['metadata'])
     
     def _create_overview(self, metadata: Dict) -> Dict:
         """Create a plan overview chunk"""
@@ -98,7 +112,7 @@ class BenefitChunker:
             text = f"Under the {metadata['plan_name']}, {text.lower()}"
         
         # Classify category
-        category = self._classify(service.lower() + " " + description.lower())
+        category = self._classify(f"{service} {description}".casefold())
         
         return {
             'text': text,
@@ -109,79 +123,85 @@ class BenefitChunker:
             **metadata
         }
     
-    def _classify(self, text: str) -> str:
-        """Classify benefit into a category"""
-        scores = {}
+    def _classify(self, text_lc: str) -> str:
+        """Classify benefit into a category (expects already-lowercased text)"""
+        # Each keyword counts once, however often it appears
+        matched = {value for _, value in self._keyword_matcher.iter(text_lc)}
+        scores = Counter(cat for _, categories in matched for cat in categories)
         
-        for category, keywords in self.categories.items():
-            score = sum(1 for kw in keywords if kw in text)
-            if score > 0:
-                scores[category] = score
-        
-        # Return category with highest score
+        # Return category with highest score (ties go to the first listed)
         if scores:
-            return max(scores, key=scores.get)
+            return max(scores, key=lambda cat: (scores[cat], -self._category_rank[cat]))
         
         return 'general'
     
     def process_all(self, input_dir: str = "data/processed"):
-        """Process all extracted JSON files"""
-        input_path = Path(input_dir)
-        json_files = list(input_path.glob("*_extracted.json"))
+        """
+        Process every plan in extracted.jsonl
         
-        if not json_files:
-            print("❌ No extracted JSON files found in data/processed/")
-            print("   Please run pdf_extractor.py first!")
-            return []
-        
-        print(f"📦 Creating chunks from {len(json_files)} files...\n")
-        
-        all_chunks = []
-        
-        for json_file in json_files:
-            print(f"  Processing: {json_file.name}")
-            chunks = self.chunk_file(str(json_file))
-            all_chunks.extend(chunks)
-            print(f"    ✅ Created {len(chunks)} chunks")
+        Returns:
+            (category_counts, plan_counts) for the chunks written
+        """
+        input_path = Path(input_dir)
+        input_file = input_path / "extracted.jsonl"
         
-        # Save all chunks
-        output_file = input_path / "all_chunks.json"
-        with open(output_file, 'w') as f:
-            json.dump(all_chunks, f, indent=2)
+        lines = []
+        if input_file.exists():
+            with open(input_file, 'rb') as f:
+                lines = [line for line in f if line.strip()]
         
-        print(f"\n✅ Total chunks created: {len(all_chunks)}")
+        if not lines:
+            print("❌ No extracted plans found in data/processed/extracted.jsonl")
+            print("   Please run pdf_extractor.py first!")
+            return Counter(), Counter()
+        
+        print(f"📦 Creating chunks from {len(lines)} plans...\n")
+        
+        # Only the counts are kept in memory for the statistics; the chunks
+        # themselves go straight to disk
+        category_counts = Counter()
+        plan_counts = Counter()
+        
+        # Chunks are streamed to disk as NDJSON (one object per line) as
+        # each file finishes, instead of dumping one big list at the end
+        output_file = input_path / "all_chunks.ndjson"
+        
+        # Plans are independent, so chunk them in parallel (workers get the
+        # raw JSON line and parse it themselves)
+        max_workers = min(len(lines), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as ex, \
+                open(output_file, 'wb') as f:
+            for chunks in ex.map(self.chunk_line, lines):
+                print(f"  Processing: {chunks[0].get('plan_name', 'Unknown plan')}")
+                for chunk in chunks:
+                    f.write(orjson.dumps(chunk))
+                    f.write(b'\n')
+                    category_counts[chunk.get('category', 'unknown')] += 1
+                    plan_counts[chunk.get('plan_name', 'unknown')] += 1
+                print(f"    ✅ Created {len(chunks)} chunks")
+        
+        print(f"\n✅ Total chunks created: {sum(plan_counts.values())}")
         print(f"💾 Saved to: {output_file}\n")
         
         # Print statistics
-        self._print_statistics(all_chunks)
+        self._print_statistics(category_counts, plan_counts)
         
-        return all_chunks
+        return category_counts, plan_counts
     
-    def _print_statistics(self, chunks: List[Dict]):
+    def _print_statistics(self, category_counts: Counter, plan_counts: Counter):
         """Print statistics about chunks"""
         print("📊 Chunk Statistics:")
         
         # Count by category
-        categories = {}
-        for chunk in chunks:
-            cat = chunk.get('category', 'unknown')
-            categories[cat] = categories.get(cat, 0) + 1
-        
         print("\n  By Category:")
-        for cat, count in sorted(categories.items(), key=lambda x: x[1], reverse=True):
+        for cat, count in category_counts.most_common():
             print(f"    {cat:20s}: {count}")
         
         # Count by plan
-        plans = {}
-        for chunk in chunks:
-            plan = chunk.get('plan_name', 'unknown')
-            plans[plan] = plans.get(plan, 0) + 1
-        
         print("\n  By Plan:")
-        for plan, count in plans.items():
+        for plan, count in plan_counts.items():
             print(f"    {plan}: {count} chunks")
 
-
 if __name__ == "__main__":
     chunker = BenefitChunker()
     chunker.process_all()
\ No newline at end of file
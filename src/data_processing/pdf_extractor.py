@@ -3,10 +3,38 @@ Extract structured data from insurance PDFs
 """
 
 import pdfplumber
+import os
 import re
-import json
+import orjson
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional
+
+
+# Compiled once at import instead of on every metadata lookup
+_YEAR_RE = re.compile(r'20\d{2}')
+_PREMIUM_RE = re.compile(r'(?:Monthly\s+)?Premium[:\s]*\$(\d+)', re.IGNORECASE)
+_DEDUCTIBLE_RE = re.compile(r'(?:Annual\s+)?Deductible[:\s]*\$(\d+)', re.IGNORECASE)
+
+_PROVIDERS = ('Blue Cross', 'Harvard Pilgrim', 'Tufts', 'Fallon', 'WellSense')
+_PROVIDER_RE = re.compile('|'.join(map(re.escape, _PROVIDERS)))
+
+# Keywords that mark a benefit service header
+_SERVICE_KEYWORDS = (
+    'visit', 'care', 'exam', 'test', 'therapy', 'surgery',
+    'hospital', 'prescription', 'drug', 'vision', 'dental',
+    'menttal', 'physical', 'emergency', 'urgent', 'preventive',
+    'laboratory', 'x-ray', 'imaging', 'outpatient', 'inpatient',
+    'gym', 'membership', 'telehealth', 'transportation', 'wellness',
+    'hearing', 'eyewear', 'allowance', 'meal', 'support', 'acupuncture',
+    'tier', 'rehabilitation', 'skilled', 'home health', 'over-the-counter'
+)
+
+# One scan finds any keyword, instead of a substring search per keyword
+_SERVICE_RE = re.compile('|'.join(map(re.escape, _SERVICE_KEYWORDS)))
+
+# Lines starting like this are never headers ("you pay" in any case)
+_REJECT_RE = re.compile(r'(?i:you pay)|Plan Type:|Monthly Premium:')
 
 
 class PDFExtractor:
@@ -25,21 +53,20 @@ class PDFExtractor:
         print(f"  📄 Extracting: {self.pdf_path.name}")
         
         with pdfplumber.open(self.pdf_path) as pdf:
-            # Extract metadata from first page
-            first_page = pdf.pages[0].extract_text()
-            self.data['metadata'] = self._extract_metadata(first_page)
+            # Extract all text (each page only once)
+            page_texts = [page.extract_text() for page in pdf.pages]
             
-            # Extract all text
-            full_text = []
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    full_text.append(text)
+            # Extract metadata from first page
+            self.data['metadata'] = self._extract_metadata(page_texts[0])
             
-            self.data['full_text'] = '\n\n'.join(full_text)
+            page_texts = [text for text in page_texts if text]
+            self.data['full_text'] = '\n\n'.join(page_texts)
             
-            # Extract individual benefits
-            self.data['benefits'] = self._extract_benefits(self.data['full_text'])
+            # Extract individual benefits, fed line by line from the pages
+            # instead of re-splitting the joined full text
+            self.data['benefits'] = self._extract_benefits(
+                line for text in page_texts for line in text.split('\n')
+            )
         
         print(f"    ✅ Found {len(self.data['benefits'])} benefits")
         return self.data
@@ -54,16 +81,14 @@ class PDFExtractor:
         if lines:
             metadata['plan_name'] = lines[0]
         
-        # Provider
-        providers = ['Blue Cross', 'Harvard Pilgrim', 'Tufts', 'Fallon', 'WellSense']
-        for line in lines[:10]:
-            for provider in providers:
-                if provider in line:
-                    metadata['provider'] = line
-                    break
+        # Provider (the last matching line among the first 10 wins)
+        for line in reversed(lines[:10]):
+            if _PROVIDER_RE.search(line):
+                metadata['provider'] = line
+                break
         
         # Year
-        year_match = re.search(r'20\d{2}', text)
+        year_match = _YEAR_RE.search(text)
         if year_match:
             metadata['year'] = year_match.group()
         
@@ -74,33 +99,20 @@ class PDFExtractor:
                 break
         
         # Costs
-        premium_patterns = [
-            r'Premium[:\s]*\$(\d+)',
-            r'Monthly Premium[:\s]*\$(\d+)',
-        ]
-        for pattern in premium_patterns:
-            premium_match = re.search(pattern, text, re.IGNORECASE)
-            if premium_match:
-                metadata['monthly_premium'] = int(premium_match.group(1))
-                break
+        premium_match = _PREMIUM_RE.search(text)
+        if premium_match:
+            metadata['monthly_premium'] = int(premium_match.group(1))
         
-        deductible_patterns = [
-            r'Deductible[:\s]*\$(\d+)',
-            r'Annual Deductible[:\s]*\$(\d+)',
-        ]
-        for pattern in deductible_patterns:
-            deductible_match = re.search(pattern, text, re.IGNORECASE)
-            if deductible_match:
-                metadata['deductible'] = int(deductible_match.group(1))
-                break
+        deductible_match = _DEDUCTIBLE_RE.search(text)
+        if deductible_match:
+            metadata['deductible'] = int(deductible_match.group(1))
         
         return metadata
     
-    def _extract_benefits(self, text: str) -> List[Dict]:
-        """Extract individual benefits with descriptions"""
+    def _extract_benefits(self, lines: Iterable[str]) -> List[Dict]:
+        """Extract individual benefits with descriptions from a stream of lines"""
         benefits = []
         
-        lines = text.split('\n')
         current_service = None
         current_description = []
         
@@ -142,45 +154,44 @@ class PDFExtractor:
         """Detect if a line is a benefit service name"""
         # Service headers are usually short and contain service keywords
         
-        if len(line) > 80:
-            return False
-        
-        if line.lower().startswith('you pay'):
+        if len(line) > 80 or _REJECT_RE.match(line):
             return False
         
-        if line.startswith('Plan Type:') or line.startswith('Monthly Premium:'):
-            return False
-        
-        service_keywords = [
-            'visit', 'care', 'exam', 'test', 'therapy', 'surgery',
-            'hospital', 'prescription', 'drug', 'vision', 'dental',
-            'menttal', 'physical', 'emergency', 'urgent', 'preventive',
-            'laboratory', 'x-ray', 'imaging', 'outpatient', 'inpatient',
-            'gym', 'membership', 'telehealth', 'transportation', 'wellness',
-            'hearing', 'eyewear', 'allowance', 'meal', 'support', 'acupuncture',
-            'tier', 'rehabilitation', 'skilled', 'home health', 'over-the-counter'
-        ]
-        
-        line_lower = line.lower()
-        return any(keyword in line_lower for keyword in service_keywords)
-    
-    def save(self, output_dir: str = "data/processed"):
-        """Save extracted data as JSON"""
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
-        
-        filename = self.pdf_path.stem + "_extracted.json"
-        filepath = output_path / filename
-        
-        with open(filepath, 'w') as f:
-            json.dump(self.data, f, indent=2)
+        # Lowercase once, only for lines that passed the cheap checks
+        return _SERVICE_RE.search(line.lower()) is not None
 
-        print(f"    💾 Saved: {filename}")
-        return filepath
 
+def _process_one(pdf_file: Path) -> Optional[bytes]:
+    """
+    Extract one PDF (runs in a worker process)
+    
+    Errors are caught here so one bad file doesn't abort the batch.
+    
+    Returns:
+        The extracted data as one compact JSON line, or None if
+        extraction failed
+    """
+    try:
+        extractor = PDFExtractor(pdf_file)
+        extractor.extract()
+        print()
+        return orjson.dumps(extractor.data)
+    except Exception as e:
+        print(f"    ❌ Error processing {pdf_file.name}: {e}\n")
+        return None
 
-def extract_all_pdfs(input_dir: str = "data/dummy_dataset"):
-    """Process all PDFs in directory"""
+
+def extract_all_pdfs(input_dir: str = "data/dummy_dataset",
+                     output_dir: str = "data/processed") -> List[Path]:
+    """
+    Process all PDFs in directory
+    
+    Every PDF becomes one line of output_dir/extracted.jsonl, written by
+    this process as results come back from the workers.
+    
+    Returns:
+        The PDFs that were extracted successfully
+    """
     input_path = Path(input_dir)
     pdf_files = list(input_path.glob("*.pdf"))
     
@@ -190,27 +201,31 @@ def extract_all_pdfs(input_dir: str = "data/dummy_dataset"):
         return []
     
     print(f"📚 Extracting text from {len(pdf_files)} PDFs...\n")
-
-    extracted_files = []
-    for pdf_file in pdf_files:
-        try:
-            extractor = PDFExtractor(pdf_file)
-            extractor.extract()
-            output = extractor.save()
-            extracted_files.append(output)
-            print()
-        except Exception as e:
-            print(f"    ❌ Error processing {pdf_file.name}: {e}\n")
-    
-    print(f"🎉 Extraction complete! Processed {len(extracted_files)} files")
-    print(f"📁 Saved to: data/processed/\n")
-    
-    # List what was created
+    
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    output_file = output_path / "extracted.jsonl"
+    
+    extracted = []
+    
+    # PDFs are independent, so extract them in parallel
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex, \
+            open(output_file, 'wb') as f:
+        for pdf_file, line in zip(pdf_files, ex.map(_process_one, pdf_files)):
+            if line is not None:
+                f.write(line)
+                f.write(b'\n')
+                extracted.append(pdf_file)
+    
+    print(f"🎉 Extraction complete! Processed {len(extracted)} files")
+    print(f"📁 Saved to: {output_file}\n")
+    
+    # List what was extracted
     print("📄 Extracted files:")
-    for file in extracted_files:
+    for file in extracted:
         print(f"  - {file.name}")
     
-    return extracted_files
+    return extracted
 
 
 if __name__ == "__main__":
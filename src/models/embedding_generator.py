@@ -2,20 +2,22 @@
 Generate embeddings and build FAISS search index
 """
 
+from contextlib import nullcontext
 from sentence_transformers import SentenceTransformer
 import faiss
+import torch
 import numpy as np
 import pickle
-import json
+import orjson
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 from tqdm import tqdm
 
 
 class EmbeddingGenerator:
     """Generate embeddings and build searchable index"""
     
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', use_bf16: bool = False):
         """
         Initialize embedding model
         
@@ -24,41 +26,144 @@ class EmbeddingGenerator:
         - Good quality: 384 dimensions
         - Small size: ~90MB
         - Trained on diverse text
+        
+        Args:
+            model_name: SentenceTransformer model to load
+            use_bf16: Run CPU inference under bfloat16 autocast (only
+                worth it on CPUs with native bf16 support)
         """
         print(f"🤖 Loading embedding model: {model_name}")
         self.model = SentenceTransformer(model_name)
         self.dimension = self.model.get_sentence_embedding_dimension()
-        print(f"✅ Model loaded! Embedding dimension: {self.dimension}\n")
+        
+        # Half precision on GPU: half the memory traffic, tensor-core matmuls
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        if self.device == 'cuda':
+            self.model = self.model.half().to('cuda')
+        self.use_bf16 = use_bf16 and self.device == 'cpu'
+        self._batch_size = None
+        
+        precision = 'fp16' if self.device == 'cuda' else ('bf16' if self.use_bf16 else 'fp32')
+        print(f"✅ Model loaded! Embedding dimension: {self.dimension} ({self.device}, {precision})\n")
     
-    def generate_embeddings(self, chunks: List[Dict], batch_size: int = 32) -> np.ndarray:
+    def _autocast(self):
+        """bfloat16 autocast context for CPU inference, or a no-op"""
+        if self.use_bf16:
+            return torch.autocast(device_type='cpu', dtype=torch.bfloat16)
+        return nullcontext()
+    
+    def _pick_batch_size(self, texts: List[str]) -> int:
+        """
+        Find the largest batch size that fits in GPU memory
+        
+        Encodes one batch of the given texts at each candidate size and
+        keeps the first that does not run out of memory. The result is
+        cached, so the probe runs once per generator.
+        
+        Args:
+            texts: Texts to probe with (pass the longest ones - worst case)
+        
+        Returns:
+            Batch size to use
+        """
+        if self._batch_size is not None:
+            return self._batch_size
+        
+        if self.device != 'cuda':
+            self._batch_size = 32
+            return self._batch_size
+        
+        for size in (256, 128, 64, 32, 16):
+            try:
+                with self._autocast():
+                    self.model.encode(texts[-size:], batch_size=size, convert_to_tensor=True)
+                self._batch_size = size
+                break
+            except torch.cuda.OutOfMemoryError:
+                torch.cuda.empty_cache()
+        else:
+            self._batch_size = 8
+        
+        return self._batch_size
+    
+    def generate_embeddings(self, chunks: List[Dict], batch_size: Optional[int] = None,
+                            use_multi_process: bool = False) -> np.ndarray:
         """
         Generate embeddings for all chunks
         
         Args:
             chunks: List of chunk dictionaries with 'text' field
-            batch_size: Process this many chunks at once (faster)
+            batch_size: Process this many chunks at once (faster);
+                None = probe GPU memory for the largest size that fits
+            use_multi_process: Shard encoding across all GPUs (or CPU
+                workers when there is no GPU)
         
         Returns:
             numpy array of embeddings (shape: [num_chunks, dimension])
         """
         texts = [chunk['text'] for chunk in chunks]
         
+        # Encode shortest texts first so each batch pads to a similar length
+        order = np.argsort([len(text) for text in texts], kind='stable')
+        sorted_texts = [texts[i] for i in order]
+        
+        if batch_size is None:
+            batch_size = self._pick_batch_size(sorted_texts)
+        
         print(f"🔄 Generating embeddings for {len(texts)} chunks...")
         print(f"   Using batch size: {batch_size}")
         
-        # Generate embeddings with progress bar
-        embeddings = self.model.encode(
-            texts,
-            batch_size=batch_size,
-            show_progress_bar=True,
-            convert_to_numpy=True,
-            normalize_embeddings=True  # L2 normalization for better similarity
-        )
+        # One preallocated float32 output; rows are written straight to
+        # their chunk's position (row i must match chunks[i])
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        
+        if use_multi_process:
+            embeddings[order] = self._encode_multi_process(sorted_texts, batch_size)
+        else:
+            # Generate embeddings batch by batch with progress bar
+            for start in tqdm(range(0, len(texts), batch_size), desc="Batches"):
+                with self._autocast():
+                    batch = self.model.encode(
+                        sorted_texts[start:start + batch_size],
+                        batch_size=batch_size,
+                        convert_to_tensor=True,  # stays on-device until the copy
+                        normalize_embeddings=True  # L2 normalization for better similarity
+                    )
+                
+                # FAISS needs float32 on the host
+                embeddings[order[start:start + batch_size]] = batch.float().cpu().numpy()
         
         print(f"✅ Generated embeddings shape: {embeddings.shape}\n")
         return embeddings
     
-    def build_faiss_index(self, embeddings: np.ndarray) -> faiss.Index:
+    def _encode_multi_process(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """
+        Encode texts with one worker process per GPU (or CPU worker)
+        
+        Args:
+            texts: Texts to encode
+            batch_size: Batch size inside each worker
+        
+        Returns:
+            L2-normalized float32 embeddings, in input order
+        """
+        pool = self.model.start_multi_process_pool()
+        print(f"   Encoding with {len(pool['processes'])} worker processes")
+        try:
+            embeddings = self.model.encode_multi_process(texts, pool, batch_size=batch_size)
+        finally:
+            self.model.stop_multi_process_pool(pool)
+        
+        # encode_multi_process has no normalize option
+        embeddings = embeddings.astype(np.float32, copy=False)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings
+    
+    def build_faiss_index(self, embeddings: np.ndarray, m: int = 32,
+                          ef_construction: int = 200,
+                          ef_search: int = 50,
+                          ivf_threshold: int = 100_000,
+                          nprobe: int = 16) -> faiss.Index:
         """
         Build FAISS index for fast similarity search
         
@@ -68,24 +173,70 @@ class EmbeddingGenerator:
         
         Args:
             embeddings: numpy array of embeddings
+            m: Number of graph neighbors per vector (HNSW only)
+            ef_construction: Candidate list size while building (HNSW only)
+            ef_search: Default candidate list size while searching (HNSW only)
+            ivf_threshold: From this many vectors on, build an IVF-PQ
+                index instead of HNSW
+            nprobe: Default number of lists scanned per search (IVF-PQ only)
         
         Returns:
             FAISS index
         """
         print("🔨 Building FAISS search index...")
         
+        # FAISS wants C-contiguous float32; no copy when it already is
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        
+        if len(embeddings) >= ivf_threshold:
+            return self._build_ivfpq_index(embeddings, nprobe=nprobe)
+        
         # Use HNSW (Hierarchical Navigable Small World) index
         # - Fast approximate search
         # - Good quality results
         # - Works well for 1K - 1M vectors
+        #
+        # Vectors are stored as 8-bit scalar codes (SQ8): 4x smaller than
+        # float32, and the retriever reranks candidates with exact vectors
+        
+        index = faiss.IndexHNSWSQ(self.dimension, faiss.ScalarQuantizer.QT_8bit, m)
+        index.hnsw.efConstruction = ef_construction  # Higher = better quality, slower build
+        index.hnsw.efSearch = ef_search  # Higher = better search quality (~95-99% recall at 50)
+        
+        # Learn the per-dimension value ranges for quantization
+        index.train(embeddings)
+        
+        # Add embeddings to index
+        print(f"   Adding {len(embeddings)} vectors to index...")
+        index.add(embeddings)
+        
+        print(f"✅ FAISS index built! Total vectors: {index.ntotal}\n")
+        return index
+    
+    def _build_ivfpq_index(self, embeddings: np.ndarray, nprobe: int = 16) -> faiss.Index:
+        """
+        Build an IVF-PQ index for large corpora
+        
+        - Vectors are clustered into ~4*sqrt(N) lists; a search only
+          scans the `nprobe` closest lists
+        - Product quantization stores each vector in ~1 byte per 8 dims
+        - Needs enough vectors to train (hence only used past a threshold)
+        """
+        nlist = int(4 * np.sqrt(len(embeddings)))
+        
+        # PQ sub-vectors must split the dimension evenly
+        pq_m = max(i for i in range(1, 49) if self.dimension % i == 0)
         
-        index = faiss.IndexHNSWFlat(self.dimension, 32)
-        index.hnsw.efConstruction = 40  # Higher = better quality, slower build
-        index.hnsw.efSearch = 16  # Higher = better search quality
+        quantizer = faiss.IndexHNSWFlat(self.dimension, 32)
+        index = faiss.IndexIVFPQ(quantizer, self.dimension, nlist, pq_m, 8)
+        
+        print(f"   Training IVF-PQ ({nlist} lists, {pq_m} sub-quantizers)...")
+        index.train(embeddings)
+        index.nprobe = nprobe
         
         # Add embeddings to index
         print(f"   Adding {len(embeddings)} vectors to index...")
-        index.add(embeddings.astype('float32'))
+        index.add(embeddings)
         
         print(f"✅ FAISS index built! Total vectors: {index.ntotal}\n")
         return index
@@ -114,12 +265,12 @@ class EmbeddingGenerator:
         # Save chunks (needed to retrieve original text)
         chunks_file = output_path / "chunks.pkl"
         with open(chunks_file, 'wb') as f:
-            pickle.dump(chunks, f)
+            pickle.dump(chunks, f, protocol=pickle.HIGHEST_PROTOCOL)
         print(f"   ✅ Saved chunks: {chunks_file}")
         
         # Save embeddings (useful for analysis)
         embeddings_file = output_path / "embeddings.npy"
-        np.save(embeddings_file, embeddings)
+        np.save(embeddings_file, np.asarray(embeddings, dtype=np.float32))
         print(f"   ✅ Saved embeddings: {embeddings_file}")
         
         # Save metadata
@@ -127,15 +278,14 @@ class EmbeddingGenerator:
             'total_chunks': len(chunks),
             'embedding_dimension': self.dimension,
             'model_name': 'all-MiniLM-L6-v2',
-            'index_type': 'HNSW',
+            **self._index_params(index),
             'plans': list(set(c.get('plan_name', 'Unknown') for c in chunks)),
             'categories': list(set(c.get('category', 'unknown') for c in chunks)),
             'total_plans': len(set(c.get('plan_name', 'Unknown') for c in chunks))
         }
         
         metadata_file = output_path / "metadata.json"
-        with open(metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        metadata_file.write_bytes(orjson.dumps(metadata, option=orjson.OPT_INDENT_2))
         print(f"   ✅ Saved metadata: {metadata_file}")
         
         print(f"\n🎉 All files saved to: {output_path}")
@@ -147,6 +297,17 @@ class EmbeddingGenerator:
         print(f"   Categories: {len(metadata['categories'])}")
         print(f"   Embedding dimensions: {metadata['embedding_dimension']}")
     
+    def _index_params(self, index: faiss.Index) -> Dict:
+        """Describe the index type and its search parameters for metadata.json"""
+        if isinstance(index, faiss.IndexIVF):
+            return {'index_type': 'IVF_PQ', 'nlist': index.nlist, 'nprobe': index.nprobe}
+        
+        return {
+            'index_type': 'HNSW_SQ8',
+            'ef_construction': index.hnsw.efConstruction,
+            'ef_search': index.hnsw.efSearch,
+        }
+    
     def load_all(self, index_dir: str = "data/index"):
         """
         Load saved index and data
@@ -161,8 +322,9 @@ class EmbeddingGenerator:
         
         print("📂 Loading index from disk...")
         
-        # Load FAISS index
-        index = faiss.read_index(str(index_path / "benefits.index"))
+        # Load FAISS index (memory-mapped where the format allows it)
+        index = faiss.read_index(str(index_path / "benefits.index"),
+                                 faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
         print(f"   ✅ Loaded index with {index.ntotal} vectors")
         
         # Load chunks
@@ -170,16 +332,19 @@ class EmbeddingGenerator:
             chunks = pickle.load(f)
         print(f"   ✅ Loaded {len(chunks)} chunks")
         
-        # Load embeddings
-        embeddings = np.load(index_path / "embeddings.npy")
+        # Load embeddings (memory-mapped, pages are read on demand)
+        embeddings = np.load(index_path / "embeddings.npy", mmap_mode='r')
         print(f"   ✅ Loaded embeddings: {embeddings.shape}")
         
         return index, chunks, embeddings
 
 
-def build_search_index():
+def build_search_index(use_multi_process: bool = False):
     """
     Complete pipeline: Load chunks → Generate embeddings → Build index → Save
+    
+    Args:
+        use_multi_process: Shard embedding across all GPUs / CPU workers
     """
     print("="*60)
     print("🚀 BUILDING HEALTHCARE BENEFITS SEARCH INDEX")
@@ -187,16 +352,16 @@ def build_search_index():
     print()
     
     # Load chunks
-    chunks_file = Path("data/processed/all_chunks.json")
+    chunks_file = Path("data/processed/all_chunks.ndjson")
     
     if not chunks_file.exists():
-        print("❌ Error: all_chunks.json not found!")
+        print("❌ Error: all_chunks.ndjson not found!")
         print("   Please run chunker.py first.")
         return None, None, None
     
     print("📂 Loading chunks...")
-    with open(chunks_file, 'r') as f:
-        chunks = json.load(f)
+    with open(chunks_file, 'rb') as f:
+        chunks = [orjson.loads(line) for line in f]
     
     print(f"✅ Loaded {len(chunks)} chunks\n")
     
@@ -204,7 +369,8 @@ def build_search_index():
     generator = EmbeddingGenerator()
     
     # Generate embeddings
-    embeddings = generator.generate_embeddings(chunks, batch_size=32)
+    embeddings = generator.generate_embeddings(chunks, batch_size=None,
+                                               use_multi_process=use_multi_process)
     
     # Build index
     index = generator.build_faiss_index(embeddings)
@@ -220,4 +386,6 @@ def build_search_index():
 
 
 if __name__ == "__main__":
-    build_search_index()
\ No newline at end of file
+    import sys
+    
+    build_search_index(use_multi_process="--multi-process" in sys.argv)
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Rerank retrieved chunks with term-level similarity
+"""
+
+import re
+from dataclasses import replace
+from typing import List
+
+from src.models.retriever import SearchResult
+
+
+# Words that carry no benefit meaning; matching them only adds noise
+_STOPWORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'does',
+    'for', 'from', 'how', 'i', 'in', 'is', 'it', 'its', 'me', 'much', 'my',
+    'of', 'on', 'or', 'our', 'per', 'the', 'this', 'to', 'what', "what's",
+    'with', 'you', 'your',
+})
+
+_TERM_RE = re.compile(r"[a-z0-9][a-z0-9'-]*")
+
+
+class HybridReranker:
+    """
+    Combine document-level and term-level similarity
+    
+    The document score is the retriever's similarity. The term score
+    matches every query term to its closest term in the chunk and
+    averages those cosines. The final score is the harmonic mean of the
+    two, so a chunk must do well on both to rank high.
+    """
+    
+    def __init__(self, model):
+        """
+        Args:
+            model: SentenceTransformer used to embed terms (the retriever's)
+        """
+        self.model = model
+    
+    def _terms(self, text: str) -> List[str]:
+        """Unique lowercase content words of a text, in order"""
+        return list(dict.fromkeys(
+            term for term in _TERM_RE.findall(text.lower()) if term not in _STOPWORDS
+        ))
+    
+    def rerank(self, query: str, result_lists: List[List[SearchResult]],
+               text_key: str = 'description') -> List[List[SearchResult]]:
+        """
+        Rerank several result lists for the same query
+        
+        All terms (query and every result) are embedded in one model call
+        and scored with one matrix product.
+        
+        Args:
+            query: The user's query
+            result_lists: Result lists from the retriever (e.g. one per plan)
+            text_key: Chunk field to take terms from (falls back to 'text')
+        
+        Returns:
+            The result lists sorted by 'hybrid_score', ranks renumbered
+        """
+        query_terms = self._terms(query)
+        if not query_terms:
+            return result_lists
+        
+        doc_terms = [[self._terms(getattr(result, text_key) or result.text) for result in results]
+                     for results in result_lists]
+        
+        vocab = list(dict.fromkeys(
+            query_terms + [t for per_list in doc_terms for terms in per_list for t in terms]
+        ))
+        
+        embeddings = self.model.encode(
+            vocab,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+        position = {term: i for i, term in enumerate(vocab)}
+        
+        # Cosine of every query term against every vocabulary term
+        term_sims = embeddings[:len(query_terms)] @ embeddings.T
+        
+        reranked = []
+        for results, per_list in zip(result_lists, doc_terms):
+            scored = []
+            for result, terms in zip(results, per_list):
+                if terms:
+                    cols = [position[t] for t in terms]
+                    term_score = float(term_sims[:, cols].max(axis=1).mean())
+                else:
+                    term_score = 0.0
+                
+                # similarity_score is 1 - L2^2 = 2cos - 1; go back to cosine
+                doc_score = (result.similarity_score + 1) / 2
+                if doc_score > 0 and term_score > 0:
+                    hybrid = 2 * doc_score * term_score / (doc_score + term_score)
+                else:
+                    hybrid = 0.0
+                
+                scored.append((hybrid, term_score, result))
+            
+            scored.sort(key=lambda item: item[0], reverse=True)
+            reranked.append([
+                replace(result, term_score=term_score, hybrid_score=hybrid, rank=rank)
+                for rank, (hybrid, term_score, result) in enumerate(scored, 1)
+            ])
+        
+        return reranked
@@ -3,22 +3,115 @@ Retrieve relevant chunks from FAISS index
 """
 
 import faiss
+import os
+import sys
 import pickle
+from collections import OrderedDict
+from dataclasses import dataclass, fields
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from sentence_transformers import SentenceTransformer
 
 
+# Batched searches parallelize over queries; more than a few threads only
+# contend with each other (and with other processes) on small containers
+faiss.omp_set_num_threads(min(os.cpu_count() or 1, 4))
+
+# Filtered searches over more chunks than this go through FAISS with an ID
+# selector; smaller subsets are cheaper to score exactly with numpy
+SELECTOR_MIN_IDS = 20_000
+
+# Low-cardinality chunk fields, interned on load
+_SHARED_FIELDS = ('plan_name', 'provider', 'plan_type', 'year', 'type', 'category')
+
+
+@dataclass(frozen=True, slots=True)
+class SearchResult:
+    """One ranked search hit: the chunk's fields plus its score"""
+    text: str
+    type: str
+    category: str
+    similarity_score: float
+    rank: int
+    chunk_id: int
+    plan_name: Optional[str] = None
+    provider: Optional[str] = None
+    plan_type: Optional[str] = None
+    year: Optional[str] = None
+    monthly_premium: Optional[int] = None
+    deductible: Optional[int] = None
+    service: Optional[str] = None
+    description: Optional[str] = None
+    term_score: Optional[float] = None  # set by HybridReranker
+    hybrid_score: Optional[float] = None  # set by HybridReranker
+
+
+# Chunk keys a SearchResult can hold (anything else is dropped)
+_RESULT_FIELDS = frozenset(f.name for f in fields(SearchResult))
+
+
+def topk_cosine(queries: np.ndarray, embeddings: np.ndarray,
+                k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k cosine similarity against pre-normalized embeddings
+    
+    Args:
+        queries: Normalized query vector (dim,) or matrix (num_queries, dim)
+        embeddings: Normalized embedding matrix (num_vectors, dim)
+        k: How many neighbors to return
+    
+    Returns:
+        tuple: (indices, scores) sorted best first, shaped (k,) for a single
+        query or (num_queries, k) for a matrix of queries
+    """
+    return topk_scores(queries @ embeddings.T, k)
+
+
+def topk_scores(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k positions of a score vector (or of each row of a score matrix)
+    
+    Args:
+        scores: Similarity scores, shape (n,) or (num_queries, n)
+        k: How many positions to return
+    
+    Returns:
+        tuple: (indices, scores) sorted best first, shaped like `scores`
+        with the last axis cut to k
+    """
+    single = scores.ndim == 1
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        indices, top_scores = empty.astype(np.int64), empty.astype(scores.dtype)
+    else:
+        # O(N) partition to the k best, then sort only those k
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(scores, part, axis=1)
+        order = np.argsort(-part_scores, axis=1)
+        indices = np.take_along_axis(part, order, axis=1)
+        top_scores = np.take_along_axis(part_scores, order, axis=1)
+    
+    if single:
+        return indices[0], top_scores[0]
+    return indices, top_scores
+
+
 class BenefitRetriever:
     """Search through insurance benefits using semantic similarity"""
     
-    def __init__(self, index_dir: str = "data/index"):
+    def __init__(self, index_dir: str = "data/index", ef_search: int = None):
         """
         Load the search index and model
         
         Args:
             index_dir: Directory containing saved index files
+            ef_search: Optional - override the search depth stored in the
+                index (HNSW efSearch, or nprobe for IVF indexes; higher =
+                better recall, slower)
         """
         self.index_dir = Path(index_dir)
         
@@ -31,23 +124,114 @@ class BenefitRetriever:
         
         print("🔍 Loading retrieval system...")
         
-        # Load FAISS index
+        # Load FAISS index read-only and memory-mapped: IVF inverted lists
+        # are paged in on demand and shared between worker processes (HNSW
+        # indexes have no mmap-able lists and are still read into RAM)
         print("   Loading FAISS index...")
-        self.index = faiss.read_index(str(self.index_dir / "benefits.index"))
+        self.index = faiss.read_index(str(self.index_dir / "benefits.index"),
+                                      faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        if ef_search:
+            if isinstance(self.index, faiss.IndexIVF):
+                self.index.nprobe = ef_search
+            else:
+                self.index.hnsw.efSearch = ef_search
         
         # Load chunks
         print("   Loading chunks...")
         with open(self.index_dir / "chunks.pkl", 'rb') as f:
             self.chunks = pickle.load(f)
         
+        # Memory-map embeddings (normalized at build time, used for exact
+        # scoring): only the rows a search touches are paged in from disk
+        print("   Loading embeddings...")
+        self.embeddings = np.load(self.index_dir / "embeddings.npy", mmap_mode='r')
+        
+        # Split chunk IDs by plan and by category once, so a filtered search
+        # only scores matching chunks (plan sub-matrices are copied on first use)
+        ids_by_plan, ids_by_category = {}, {}
+        for i, chunk in enumerate(self.chunks):
+            # Every chunk of a plan repeats the same metadata strings: keep
+            # one shared object per value instead of one copy per chunk
+            for key in _SHARED_FIELDS:
+                if isinstance(chunk.get(key), str):
+                    chunk[key] = sys.intern(chunk[key])
+            
+            ids_by_plan.setdefault(chunk.get('plan_name'), []).append(i)
+            ids_by_category.setdefault(chunk.get('category'), []).append(i)
+        self._plan_ids = {
+            plan: np.array(ids, dtype=np.int64) for plan, ids in ids_by_plan.items()
+        }
+        self._category_ids = {
+            category: np.array(ids, dtype=np.int64) for category, ids in ids_by_category.items()
+        }
+        self._plan_embeddings = {}
+        
+        # Plan / category listings never change after load
+        self._plans = sorted(plan for plan in self._plan_ids if plan is not None)
+        self._categories = sorted(c for c in self._category_ids if c is not None)
+        self._chunks_by_plan = {
+            ('Unknown' if plan is None else plan): len(ids) for plan, ids in self._plan_ids.items()
+        }
+        self._chunks_by_category = {
+            ('unknown' if c is None else c): len(ids) for c, ids in self._category_ids.items()
+        }
+        
         # Load embedding model (same one used to create embeddings)
         print("   Loading embedding model...")
         self.model = SentenceTransformer('all-MiniLM-L6-v2')
         
+        # LRU cache of query text -> embedding (repeated questions skip the model)
+        self._emb_cache = OrderedDict()
+        self._emb_cache_max = 1024
+        self._cache_hits = 0
+        self._cache_misses = 0
+        
         print(f"✅ Retriever ready! Indexed {len(self.chunks)} chunks\n")
     
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Embed a list of queries in a single batched forward pass
+        
+        Queries seen recently are served from an LRU cache; the rest
+        (duplicates only once) go through the model together.
+        
+        Args:
+            queries: User questions to embed
+        
+        Returns:
+            float32 array of normalized embeddings (shape: [num_queries, dimension])
+        """
+        missing = []
+        for query in dict.fromkeys(queries):
+            if query in self._emb_cache:
+                self._emb_cache.move_to_end(query)
+                self._cache_hits += 1
+            else:
+                missing.append(query)
+                self._cache_misses += 1
+        
+        if missing:
+            embeddings = self.model.encode(
+                missing,
+                batch_size=32,
+                normalize_embeddings=True,
+                convert_to_numpy=True
+            ).astype(np.float32, copy=False)  # already float32: no copy
+            
+            for query, embedding in zip(missing, embeddings):
+                self._emb_cache[query] = embedding
+        
+        result = np.stack([self._emb_cache[query] for query in queries])
+        
+        # Evict least recently used entries past capacity
+        while len(self._emb_cache) > self._emb_cache_max:
+            self._emb_cache.popitem(last=False)
+        
+        return result
+    
     def search(self, query: str, top_k: int = 5, 
-               plan_filter: str = None, category_filter: str = None) -> List[Dict]:
+               plan_filter: str = None, category_filter: str = None,
+               query_embedding: np.ndarray = None) -> List[SearchResult]:
         """
         Search for relevant chunks
         
@@ -56,49 +240,162 @@ class BenefitRetriever:
             top_k: How many results to return
             plan_filter: Optional - only search specific plan
             category_filter: Optional - only search specific category
+            query_embedding: Optional - precomputed normalized embedding of
+                `query` (skips the model when searching many times)
         
         Returns:
-            List of relevant chunks with similarity scores
+            SearchResult list (relevant chunks with similarity scores)
         """
         # Convert query to embedding
-        query_embedding = self.model.encode(
-            [query], 
-            normalize_embeddings=True,
-            convert_to_numpy=True
-        )
-        
-        # Search FAISS index
-        # Returns: distances (similarity scores) and indices (chunk IDs)
-        distances, indices = self.index.search(
-            query_embedding.astype('float32'), 
-            min(top_k * 3, len(self.chunks))  # Get more, then filter
-        )
-        
-        # Collect results
+        if query_embedding is None:
+            query_embedding = self.embed_queries([query])
+        else:
+            query_embedding = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        
+        return self._search_embeddings(query_embedding, top_k, [plan_filter],
+                                       category_filter)[0]
+    
+    def search_batch(self, queries: List[str], top_k: int = 5,
+                     plan_filter=None) -> List[List[SearchResult]]:
+        """
+        Search for several queries with one embedding pass and one FAISS call
+        
+        Args:
+            queries: List of user questions
+            top_k: How many results to return per query
+            plan_filter: Optional - a plan name applied to every query, or a
+                list with one plan name (or None) per query
+        
+        Returns:
+            One result list per query, in the same order as `queries`
+        """
+        if not queries:
+            return []
+        
+        query_embeddings = self.embed_queries(queries)
+        
+        if plan_filter is None or isinstance(plan_filter, str):
+            plan_filters = [plan_filter] * len(queries)
+        else:
+            plan_filters = plan_filter
+        
+        return self._search_embeddings(query_embeddings, top_k, plan_filters)
+    
+    def _search_embeddings(self, query_embeddings: np.ndarray, top_k: int,
+                           plan_filters: List[str],
+                           category_filter: str = None) -> List[List[SearchResult]]:
+        """Run embedded queries against the index and build search results"""
+        return [
+            self._collect_results(distances, ids, top_k)
+            for distances, ids in self._rank_embeddings(query_embeddings, top_k,
+                                                        plan_filters, category_filter)
+        ]
+    
+    def _rank_embeddings(self, query_embeddings: np.ndarray, top_k: int,
+                         plan_filters: List[str],
+                         category_filter: str = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Rank chunks for embedded queries
+        
+        Unfiltered queries go through FAISS together in one call; the
+        quantized index over-fetches candidates which are then reranked
+        with the exact embeddings. Filtered queries only ever see matching
+        chunks (scored exactly, or via a FAISS ID selector for large
+        subsets), so a filter can never starve the result list the way
+        post-filtering an approximate top-k can.
+        
+        Returns:
+            One (distances, chunk_ids) pair per query, best first
+        """
+        results = [None] * len(query_embeddings)
+        
+        unfiltered = [row for row, plan in enumerate(plan_filters)
+                      if not plan and not category_filter]
+        if unfiltered:
+            # Search FAISS index for candidate chunk IDs
+            _, indices = self.index.search(
+                query_embeddings[unfiltered],
+                min(top_k * 4, len(self.chunks))  # Get more, then rerank
+            )
+            for row, row_indices in zip(unfiltered, indices):
+                candidates = row_indices[row_indices != -1]  # FAISS pads with -1
+                idx, scores = topk_cosine(query_embeddings[row],
+                                          self.embeddings[candidates], top_k)
+                results[row] = (2 - 2 * scores, candidates[idx])
+        
+        for row, plan in enumerate(plan_filters):
+            if results[row] is None:
+                results[row] = self._search_exact(query_embeddings[row], top_k,
+                                                  plan, category_filter)
+        
+        return results
+    
+    def _filter_ids(self, plan_filter: str = None, category_filter: str = None) -> np.ndarray:
+        """Sorted chunk IDs matching the plan and/or category filter"""
+        empty = np.empty(0, dtype=np.int64)
+        if plan_filter and category_filter:
+            return np.intersect1d(self._plan_ids.get(plan_filter, empty),
+                                  self._category_ids.get(category_filter, empty),
+                                  assume_unique=True)
+        if plan_filter:
+            return self._plan_ids.get(plan_filter, empty)
+        return self._category_ids.get(category_filter, empty)
+    
+    def _search_exact(self, query_embedding: np.ndarray, top_k: int,
+                      plan_filter: str = None,
+                      category_filter: str = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Cosine ranking restricted to chunks matching the filters"""
+        ids = self._filter_ids(plan_filter, category_filter)
+        
+        if len(ids) >= SELECTOR_MIN_IDS:
+            return self._search_selected(query_embedding, top_k, ids)
+        
+        if plan_filter and not category_filter:
+            embeddings = self._plan_embeddings.get(plan_filter)
+            if embeddings is None:
+                embeddings = self._plan_embeddings[plan_filter] = self.embeddings[ids]
+        else:
+            embeddings = self.embeddings[ids]
+        
+        idx, scores = topk_cosine(query_embedding, embeddings, top_k)
+        
+        # Same scale as FAISS's L2 distance on unit vectors: |q - e|^2 = 2 - 2cos
+        return 2 - 2 * scores, ids[idx]
+    
+    def _search_selected(self, query_embedding: np.ndarray, top_k: int,
+                         ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate search that only visits the given chunk IDs
+        
+        The filter is pushed into FAISS with an ID selector, so the index
+        skips ineligible vectors instead of returning them; the candidates
+        are then reranked with the exact embeddings.
+        """
+        selector = faiss.IDSelectorBatch(ids)
+        if isinstance(self.index, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=self.index.nprobe)
+        else:
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=self.index.hnsw.efSearch)
+        
+        _, indices = self.index.search(query_embedding.reshape(1, -1),
+                                       min(top_k * 4, len(ids)), params=params)
+        candidates = indices[0][indices[0] != -1]
+        idx, scores = topk_cosine(query_embedding, self.embeddings[candidates], top_k)
+        return 2 - 2 * scores, candidates[idx]
+    
+    def _collect_results(self, distances: np.ndarray, indices: np.ndarray,
+                         top_k: int) -> List[SearchResult]:
+        """Turn one row of search output into search results"""
         results = []
-        for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-            if idx == -1:  # FAISS returns -1 for empty results
-                continue
-            
-            chunk = self.chunks[idx].copy()
+        for i, (distance, idx) in enumerate(zip(distances[:top_k], indices[:top_k])):
+            chunk = self.chunks[idx]
             
-            # Apply filters
-            if plan_filter and chunk.get('plan_name') != plan_filter:
-                continue
-            
-            if category_filter and chunk.get('category') != category_filter:
-                continue
-            
-            # Add search metadata
-            chunk['similarity_score'] = float(1 - distance)  # Convert distance to similarity
-            chunk['rank'] = i + 1
-            chunk['chunk_id'] = int(idx)
-            
-            results.append(chunk)
-            
-            # Stop when we have enough results
-            if len(results) >= top_k:
-                break
+            results.append(SearchResult(
+                **{key: value for key, value in chunk.items() if key in _RESULT_FIELDS},
+                similarity_score=float(1 - distance),  # Convert distance to similarity
+                rank=i + 1,
+                chunk_id=int(idx)
+            ))
         
         return results
     
@@ -113,7 +410,7 @@ class BenefitRetriever:
         # Group by plan
         by_plan = {}
         for result in results:
-            plan = result.get('plan_name', 'Unknown')
+            plan = result.plan_name or 'Unknown'
             if plan not in by_plan:
                 by_plan[plan] = []
             by_plan[plan].append(result)
@@ -126,22 +423,22 @@ class BenefitRetriever:
             'plans_found': list(by_plan.keys())
         }
     
-    def compare_plans(self, query: str, plan_names: List[str]) -> Dict:
+    def compare_plans(self, query: str, plan_names: List[str], top_k: int = 3) -> Dict:
         """
         Compare specific benefit across multiple plans
         
         Args:
             query: Benefit to compare (e.g., "gym membership")
             plan_names: List of plan names to compare
+            top_k: How many results to keep per plan
         
         Returns:
             Comparison data for each plan
         """
-        comparison = {}
-        
-        for plan_name in plan_names:
-            results = self.search(query, top_k=3, plan_filter=plan_name)
-            comparison[plan_name] = results
+        # Same query for every plan: embedded once, filtered per plan
+        per_plan = self.search_batch([query] * len(plan_names), top_k=top_k,
+                                     plan_filter=list(plan_names))
+        comparison = dict(zip(plan_names, per_plan))
         
         return {
             'query': query,
@@ -167,41 +464,27 @@ class BenefitRetriever:
     
     def list_plans(self) -> List[str]:
         """Get list of all available plans"""
-        plans = set()
-        for chunk in self.chunks:
-            if 'plan_name' in chunk:
-                plans.add(chunk['plan_name'])
-        return sorted(list(plans))
+        return list(self._plans)
     
     def list_categories(self) -> List[str]:
         """Get list of all benefit categories"""
-        categories = set()
-        for chunk in self.chunks:
-            if 'category' in chunk:
-                categories.add(chunk['category'])
-        return sorted(list(categories))
+        return list(self._categories)
     
     def get_statistics(self) -> Dict:
         """Get statistics about indexed data"""
         stats = {
             'total_chunks': len(self.chunks),
-            'total_plans': len(self.list_plans()),
+            'total_plans': len(self._plans),
             'plans': self.list_plans(),
             'categories': self.list_categories(),
-            'chunks_by_plan': {},
-            'chunks_by_category': {}
+            # Count by plan / by category (computed at load)
+            'chunks_by_plan': dict(self._chunks_by_plan),
+            'chunks_by_category': dict(self._chunks_by_category),
+            'cache_hits': self._cache_hits,
+            'cache_misses': self._cache_misses,
+            'hit_rate': self._cache_hits / max(self._cache_hits + self._cache_misses, 1)
         }
         
-        # Count by plan
-        for chunk in self.chunks:
-            plan = chunk.get('plan_name', 'Unknown')
-            stats['chunks_by_plan'][plan] = stats['chunks_by_plan'].get(plan, 0) + 1
-        
-        # Count by category
-        for chunk in self.chunks:
-            cat = chunk.get('category', 'unknown')
-            stats['chunks_by_category'][cat] = stats['chunks_by_category'].get(cat, 0) + 1
-        
         return stats
 
 
@@ -249,10 +532,10 @@ def test_retriever():
             continue
         
         for j, result in enumerate(results, 1):
-            print(f"\n{j}. [{result['plan_name']}]")
-            print(f"   Category: {result['category']}")
-            print(f"   Similarity: {result['similarity_score']:.3f}")
-            print(f"   Text: {result['text'][:150]}...")
+            print(f"\n{j}. [{result.plan_name}]")
+            print(f"   Category: {result.category}")
+            print(f"   Similarity: {result.similarity_score:.3f}")
+            print(f"   Text: {result.text[:150]}...")
         
         print("\n")
     
@@ -2,9 +2,32 @@
 Streamlit Web Interface for Healthcare Benefits Navigator
 """
 
+import hashlib
+from collections import deque
+
+import numpy as np
 import streamlit as st
+from src.models.reranker import HybridReranker
 from src.models.retriever import BenefitRetriever
-import time
+
+# Semantic cache: recent queries per session, reused when a new query's
+# embedding is this close to one of them (same settings only)
+SEMANTIC_CACHE_SIZE = 64
+SEMANTIC_CACHE_MIN_SIM = 0.95
+
+MAX_RESULTS = 10
+
+# Sample questions offered in the search box
+SAMPLE_QUESTIONS = (
+    "Does my plan cover gym membership?",
+    "What's the copay for primary care visits?",
+    "Is dental care covered?",
+    "How much do prescription drugs cost?",
+    "Does the plan cover telehealth?",
+    "What's covered for emergency room visits?",
+    "Is vision care included?",
+    "What mental health services are covered?",
+)
 
 # Page config
 st.set_page_config(
@@ -14,42 +37,19 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better styling
-st.markdown("""
-    <style>
+# Custom CSS for better styling, whitespace-collapsed once at import.
+# Streamlit drops elements a rerun does not redraw, so it is still sent on
+# every run - as one small string instead of the indented source.
+CSS = "<style>" + " ".join("""
     .main-header {
         font-size: 5rem;
         color: #1f77b4;
         text-align: center;
         margin-bottom: 2rem;
     }
-    .plan-card {
-        padding: 1.5rem;
-        border-radius: 10px;
-        background-color: #f0f2f6;
-        margin-bottom: 1rem;
-        border-left: 5px solid #1f77b4;
-    }
-    .benefit-text {
-        font-size: 3rem;
-        line-height: 1.6;
-    }
-    .similarity-score {
-        background-color: #d4edda;
-        padding: 0.5rem;
-        border-radius: 5px;
-        display: inline-block;
-    }
-    .category-badge {
-        background-color: #17a2b8;
-        color: white;
-        padding: 0.3rem 0.8rem;
-        border-radius: 15px;
-        font-size: 0.9rem;
-        display: inline-block;
-    }
-    </style>
-""", unsafe_allow_html=True)
+""".split()) + "</style>"
+
+st.markdown(CSS, unsafe_allow_html=True)
 
 
 # Initialize retriever
@@ -59,57 +59,110 @@ def load_retriever():
     return BenefitRetriever()
 
 
-def main():
-    # Header
-    st.markdown('<h1 class="main-header">🏥 NLP-Based Healthcare Benefits Search System</h1>', 
-                unsafe_allow_html=True)
+@st.cache_resource
+def load_samples():
+    """Sample question embeddings and unfiltered results, computed once"""
+    retriever = load_retriever()
+    questions = list(SAMPLE_QUESTIONS)
     
-    st.markdown("""
-    <div style='text-align: center; margin-bottom: 2rem;'>
-        <p style='font-size: 1.2rem; color: #666;'>
-            Ask questions about your health insurance benefits!
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
+    # Embedding the samples first also warms the retriever's query cache
+    embeddings = retriever.embed_queries(questions)
     
-    # Load retriever
-    try:
-        retriever = load_retriever()
-    except FileNotFoundError:
-        st.error("❌ Search index not found! Please run `python src/models/embedding_generator.py` first.")
-        st.stop()
+    # Unfiltered results for every sample, at the slider's maximum top_k
+    results = dict(zip(SAMPLE_QUESTIONS, retriever.search_batch(questions, top_k=MAX_RESULTS)))
+    return embeddings, results
+
+
+@st.cache_resource
+def load_reranker():
+    """Term-level reranker sharing the retriever's model"""
+    return HybridReranker(load_retriever().model)
+
+
+@st.cache_data(ttl=600, max_entries=512)
+def cached_search(query: str, top_k: int, plan_f: str = None, cat_f: str = None):
+    """Search results memoized per (query, top_k, filters) across reruns"""
+    return load_retriever().search(
+        query,
+        top_k=top_k,
+        plan_filter=plan_f,
+        category_filter=cat_f
+    )
+
+
+@st.cache_data
+def cached_stats(_retriever):
+    """Index statistics, computed once (the underscore keeps the retriever out of the cache key)"""
+    return _retriever.get_statistics()
+
+
+@st.cache_data
+def filter_options(_retriever):
+    """Plan and category selectbox options, built once"""
+    stats = cached_stats(_retriever)
+    return ("All Plans", *stats['plans']), ("All Categories", *stats['categories'])
+
+
+@st.cache_data
+def category_labels(_retriever):
+    """Display name for every category ("mental_health" -> "Mental Health")"""
+    return {c: c.replace('_', ' ').title() for c in cached_stats(_retriever)['categories']}
+
+
+def semantic_search(retriever, query: str, top_k: int,
+                    plan_f: str = None, cat_f: str = None):
+    """
+    Search, reusing results of a near-duplicate recent query
     
-    # Sidebar
-    with st.sidebar:
-        st.header("📋 System Info")
-        
-        stats = retriever.get_statistics()
-        
-        st.metric("Total Plans", stats['total_plans'])
-        st.metric("Benefits Indexed", stats['total_chunks'])
-        st.metric("Categories", len(stats['categories']))
-        
-        st.divider()
-        
-        st.subheader("📊 Available Plans")
-        for plan in stats['plans']:
-            st.write(f"• {plan}")
-        
-        st.divider()
-        
-        st.subheader("⚙️ Search Settings")
-        num_results = st.slider("Number of results", 1, 10, 5)
-        
-        plan_filter = st.selectbox(
-            "Filter by plan",
-            ["All Plans"] + stats['plans']
-        )
-        
-        category_filter = st.selectbox(
-            "Filter by category",
-            ["All Categories"] + stats['categories']
-        )
+    "Is dental covered?" and "Does my plan include dental?" embed almost
+    identically, so the second one is answered from the session's cache
+    without a FAISS search. Unfiltered queries close to a sample question
+    are answered from the precomputed sample results the same way.
+    """
+    qcache = st.session_state.setdefault("qcache", deque(maxlen=SEMANTIC_CACHE_SIZE))
+    settings = (top_k, plan_f, cat_f)
+    q_emb = retriever.embed_queries([query])[0]
+    
+    candidates = [(emb, results) for emb, cached_settings, results in qcache
+                  if cached_settings == settings]
+    if candidates:
+        sims = np.stack([emb for emb, _ in candidates]) @ q_emb
+        best = int(sims.argmax())
+        if sims[best] > SEMANTIC_CACHE_MIN_SIM:
+            return candidates[best][1]
     
+    if not plan_f and not cat_f:
+        sample_embs, sample_results = load_samples()
+        sims = sample_embs @ q_emb
+        best = int(sims.argmax())
+        if sims[best] > SEMANTIC_CACHE_MIN_SIM:
+            return sample_results[SAMPLE_QUESTIONS[best]][:top_k]
+    
+    results = cached_search(query, top_k, plan_f, cat_f)
+    qcache.append((q_emb, settings, results))  # oldest entry drops off
+    return results
+
+
+def request_section(flag: str):
+    """Button callback: render the section behind `flag` on this rerun"""
+    st.session_state[flag] = True
+
+
+def handle_sample_select():
+    """Show results for a picked sample question without waiting for Search"""
+    st.session_state["show_sample"] = True
+
+
+# Fragments (Streamlit >= 1.33) rerun on their own when a widget inside
+# them changes; older versions just run the function as part of the page
+fragment = (getattr(st, "fragment", None)
+            or getattr(st, "experimental_fragment", None)
+            or (lambda func: func))
+
+
+@fragment
+def search_section(retriever, num_results: int, plan_f: str = None, cat_f: str = None):
+    """Search box and results: typing or searching reruns only this part"""
     # Main content area
     col1, col2 = st.columns([2, 1])
     
@@ -117,22 +170,11 @@ def main():
         # Search box
         st.subheader("🔍 Ask Your Question")
         
-        # Sample questions
-        sample_questions = [
-            "Does my plan cover gym membership?",
-            "What's the copay for primary care visits?",
-            "Is dental care covered?",
-            "How much do prescription drugs cost?",
-            "Does the plan cover telehealth?",
-            "What's covered for emergency room visits?",
-            "Is vision care included?",
-            "What mental health services are covered?",
-        ]
-        
         selected_sample = st.selectbox(
             "Or choose a sample question:",
-            [""] + sample_questions,
-            key="sample_selector"
+            ("",) + SAMPLE_QUESTIONS,
+            key="sample_selector",
+            on_change=handle_sample_select
         )
         
         query = st.text_input(
@@ -142,7 +184,8 @@ def main():
             label_visibility="collapsed"
         )
         
-        search_button = st.button("🔎 Search", type="primary", use_container_width=True)
+        st.button("🔎 Search", type="primary", use_container_width=True,
+                  on_click=request_section, args=("show_results",))
     
     with col2:
         st.subheader("💡 Tips")
@@ -154,70 +197,60 @@ def main():
         - "Compare gym benefits"
         """)
     
-    # Search results
-    if search_button and query:
-        with st.spinner("🔄 Searching through plans..."):
-            time.sleep(0.5)  # UX: brief pause for perceived processing
-            
-            # Apply filters
-            plan_f = None if plan_filter == "All Plans" else plan_filter
-            cat_f = None if category_filter == "All Categories" else category_filter
-            
-            results = retriever.search(
-                query, 
-                top_k=num_results,
-                plan_filter=plan_f,
-                category_filter=cat_f
-            )
-        
-        # Display results
-        st.divider()
-        st.header("📋 Search Results")
-        
-        if not results:
-            st.warning("😕 No results found. Try rephrasing your question or adjusting filters.")
+    # Results only render after a click or a sample pick; other reruns stop here
+    searched = st.session_state.pop("show_results", False) and query
+    show_sample = st.session_state.pop("show_sample", False) and selected_sample
+    if not searched and not show_sample:
+        return
+    
+    # Lay out the results area first, then fill it card by card
+    st.divider()
+    st.header("📋 Search Results")
+    status = st.empty()
+    placeholders = [st.empty() for _ in range(num_results)]
+    
+    if searched:
+        # Re-clicking Search with unchanged inputs reuses the last results
+        query_hash = hashlib.blake2s(
+            repr((query, num_results, plan_f, cat_f)).encode()
+        ).digest()
+        if st.session_state.get("_last_query_hash") == query_hash:
+            results = st.session_state["_last_results"]
         else:
-            st.success(f"✅ Found {len(results)} relevant benefits!")
-            
-            # Display each result
-            for i, result in enumerate(results, 1):
-                with st.container():
-                    # Result card
-                    st.markdown(f"""
-                    <div class="plan-card">
-                        <h3 style='color: #1f77b4; margin-bottom: 0.5rem;'>
-                            {i}. {result['plan_name']}
-                        </h3>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    col_a, col_b, col_c = st.columns([3, 1, 1])
-                    
-                    with col_a:
-                        st.markdown(f"""
-                        <div class="benefit-text">
-                            {result['text']}
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col_b:
-                        similarity_pct = result['similarity_score'] * 100
-                        st.markdown(f"""
-                        <div class="similarity-score">
-                            <strong>Relevance:</strong><br>
-                            {similarity_pct:.1f}%
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col_c:
-                        st.markdown(f"""
-                        <div class="category-badge">
-                            {result['category'].replace('_', ' ').title()}
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    st.divider()
+            with st.spinner("🔄 Searching through plans..."):
+                results = semantic_search(retriever, query, num_results, plan_f, cat_f)
+            st.session_state["_last_query_hash"] = query_hash
+            st.session_state["_last_results"] = results
+    elif plan_f or cat_f:
+        results = semantic_search(retriever, selected_sample, num_results, plan_f, cat_f)
+    else:
+        # Precomputed at load time: no embedding, no FAISS search
+        results = load_samples()[1][selected_sample][:num_results]
+    
+    if not results:
+        status.warning("😕 No results found. Try rephrasing your question or adjusting filters.")
+        return
     
+    status.success(f"✅ Found {len(results)} relevant benefits!")
+    
+    # Relevance labels and bar lengths for all cards, in one vectorized pass
+    scores = np.array([r.similarity_score for r in results])
+    relevance = np.char.mod('Relevance: %.1f%%', scores * 100)
+    bars = np.clip(scores, 0.0, 1.0)
+    pretty = category_labels(retriever)
+    
+    for placeholder, (i, result), label, bar in zip(placeholders, enumerate(results, 1),
+                                                    relevance, bars):
+        with placeholder.container(border=True):
+            st.subheader(f"{i}. {result.plan_name}")
+            st.write(result.text.replace('$', '\\$'))  # "$20 ... $40" is not LaTeX
+            st.progress(float(bar), text=str(label))
+            st.caption(pretty.get(result.category, result.category))
+
+
+@fragment
+def compare_section(retriever):
+    """Plan comparison: comparing reruns only this part"""
     # Comparison feature
     st.divider()
     st.header("⚖️ Compare Plans")
@@ -234,27 +267,97 @@ def main():
         )
     
     with col_compare_2:
-        compare_button = st.button("Compare Plans", use_container_width=True)
+        st.button("Compare Plans", use_container_width=True,
+                  on_click=request_section, args=("show_compare",))
     
-    if compare_button and compare_query:
-        with st.spinner("🔄 Comparing plans..."):
-            comparison = retriever.compare_plans(compare_query, retriever.list_plans())
+    # Only a click renders the comparison; other reruns skip it entirely
+    if not (st.session_state.pop("show_compare", False) and compare_query):
+        return
+    
+    with st.spinner("🔄 Comparing plans..."):
+        comparison = retriever.compare_plans(compare_query, retriever.list_plans(), top_k=3)
         
-        st.subheader(f"📊 Comparison: {compare_query}")
+        # Rerank each plan's candidates by query terms (one encode for all)
+        plans = list(comparison['comparison'])
+        reranked = load_reranker().rerank(compare_query, list(comparison['comparison'].values()))
+        comparison['comparison'] = dict(zip(plans, reranked))
+    
+    st.subheader(f"📊 Comparison: {compare_query}")
+    
+    # Create columns for each plan
+    plan_cols = st.columns(len(comparison['comparison']))
+    
+    for idx, (plan_name, results) in enumerate(comparison['comparison'].items()):
+        with plan_cols[idx]:
+            st.markdown(f"**{plan_name}**")
+            
+            if results:
+                result = results[0]  # Top result
+                st.info(result.description or result.text)
+                st.caption(f"Relevance: {result.similarity_score*100:.0f}%")
+            else:
+                st.warning("No information found")
+
+
+def main():
+    # Header
+    st.markdown('<h1 class="main-header">🏥 NLP-Based Healthcare Benefits Search System</h1>', 
+                unsafe_allow_html=True)
+    
+    st.markdown("""
+    <div style='text-align: center; margin-bottom: 2rem;'>
+        <p style='font-size: 1.2rem; color: #666;'>
+            Ask questions about your health insurance benefits!
+        </p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Load retriever
+    try:
+        retriever = load_retriever()
+    except FileNotFoundError:
+        st.error("❌ Search index not found! Please run `python src/models/embedding_generator.py` first.")
+        st.stop()
+    
+    # Sidebar
+    with st.sidebar:
+        st.header("📋 System Info")
         
-        # Create columns for each plan
-        plan_cols = st.columns(len(comparison['comparison']))
+        stats = cached_stats(retriever)
+        
+        st.metric("Total Plans", stats['total_plans'])
+        st.metric("Benefits Indexed", stats['total_chunks'])
+        st.metric("Categories", len(stats['categories']))
+        
+        st.divider()
         
-        for idx, (plan_name, results) in enumerate(comparison['comparison'].items()):
-            with plan_cols[idx]:
-                st.markdown(f"**{plan_name}**")
-                
-                if results:
-                    result = results[0]  # Top result
-                    st.info(result['description'])
-                    st.caption(f"Relevance: {result['similarity_score']*100:.0f}%")
-                else:
-                    st.warning("No information found")
+        st.subheader("📊 Available Plans")
+        st.markdown("\n".join(f"- {plan}" for plan in stats['plans']))
+        
+        st.divider()
+        
+        st.subheader("⚙️ Search Settings")
+        num_results = st.slider("Number of results", 1, MAX_RESULTS, 5)
+        
+        plan_options, category_options = filter_options(retriever)
+        
+        plan_filter = st.selectbox(
+            "Filter by plan",
+            plan_options
+        )
+        
+        category_filter = st.selectbox(
+            "Filter by category",
+            category_options
+        )
+    
+    # Apply filters
+    plan_f = None if plan_filter == "All Plans" else plan_filter
+    cat_f = None if category_filter == "All Categories" else category_filter
+    
+    search_section(retriever, num_results, plan_f, cat_f)
+    
+    compare_section(retriever)
     
     # Footer
     st.divider()